@@ -0,0 +1,38 @@
+"""
+Region of interest estimation shared by the viewport trackers.
+"""
+
+import numpy as np
+
+
+def calculate_region_of_interest(motion_boxes, frame_shape):
+    """
+    Calculate the primary region of interest based on motion boxes.
+
+    Args:
+        motion_boxes: List (or (N, 4) array) of motion detection bounding boxes
+        frame_shape: Shape of the video frame (height, width)
+
+    Returns:
+        Tuple (x, y, w, h) representing the region of interest center point and dimensions
+    """
+    # If no motion is detected, use the center of the frame as the default ROI
+    if len(motion_boxes) == 0:
+        height, width = frame_shape[:2]
+        return (width // 2, height // 2, 0, 0)
+
+    # Weight each box center by its area, using array operations on all boxes.
+    # Areas are promoted to int64 so the weighted sums cannot overflow and are
+    # accumulated by NumPy rather than as Python integers.
+    boxes = np.asarray(motion_boxes, dtype=np.int32)
+    areas = boxes[:, 2].astype(np.int64) * boxes[:, 3]
+    centers = boxes[:, :2] + boxes[:, 2:] // 2
+
+    # Compute the weighted average center of all motion regions
+    weighted_x_sum, weighted_y_sum = areas @ centers
+    total_area = areas.sum()
+
+    avg_x = int(weighted_x_sum / total_area)
+    avg_y = int(weighted_y_sum / total_area)
+
+    return (avg_x, avg_y, 0, 0)
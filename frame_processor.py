@@ -6,17 +6,93 @@ import cv2
 import numpy as np
 
 
-def process_video(video_path, target_fps=5, resize_dim=(1280, 720)):
+def process_video(video_path, target_fps=5, resize_dim=(1280, 720), grayscale_only=False):
     """
     Extract frames from a video at a specified frame rate.
 
+    All frames are held in memory; use iter_frames to process long videos
+    one frame at a time.
+
     Args:
         video_path: Path to the video file
         target_fps: Target frames per second to extract
         resize_dim: Dimensions to resize frames to (width, height)
+        grayscale_only: Store single-channel grayscale frames, which is all
+                        motion detection needs (a third of the memory, and no
+                        color conversion during detection)
 
     Returns:
-        List of extracted frames
+        Array of extracted frames with shape (N, height, width, 3), or
+        (N, height, width) if grayscale_only is set
+    """
+    cap, frame_interval = _open_video(video_path, target_fps)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    # Preallocate one contiguous buffer for all kept frames; the container's
+    # frame count can be off, so the buffer is grown if it turns out too small
+    n_keep = max(1, (frame_count + frame_interval - 1) // frame_interval)
+    frame_shape = (resize_dim[1], resize_dim[0])
+    if not grayscale_only:
+        frame_shape += (3,)
+    frames = np.empty((n_keep, *frame_shape), dtype=np.uint8)
+    write_idx = 0
+
+    for frame in _iter_decoded(cap, frame_interval):
+        # Double the buffer if the reported frame count was too low
+        if write_idx == len(frames):
+            frames = np.concatenate([frames, np.empty_like(frames)])
+
+        # Resize the frame to the desired dimensions (e.g., 1280x720) directly
+        # into its slot; INTER_AREA is both faster and sharper when shrinking
+        if grayscale_only:
+            resized_frame = cv2.resize(frame, resize_dim, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(resized_frame, cv2.COLOR_BGR2GRAY, dst=frames[write_idx])
+        else:
+            cv2.resize(frame, resize_dim, dst=frames[write_idx],
+                       interpolation=cv2.INTER_AREA)
+        write_idx += 1
+
+    # Return only the filled part of the buffer
+    return frames[:write_idx]
+
+
+def iter_frames(video_path, target_fps=5, resize_dim=(1280, 720), grayscale_only=False):
+    """
+    Lazily extract frames from a video at a specified frame rate.
+
+    Frames are decoded one at a time as the generator is consumed, so memory
+    use does not grow with the length of the video.
+
+    Args:
+        video_path: Path to the video file
+        target_fps: Target frames per second to extract
+        resize_dim: Dimensions to resize frames to (width, height)
+        grayscale_only: Yield single-channel grayscale frames
+
+    Yields:
+        Resized frames of shape (height, width, 3), or (height, width) if
+        grayscale_only is set
+    """
+    cap, frame_interval = _open_video(video_path, target_fps)
+
+    for frame in _iter_decoded(cap, frame_interval):
+        resized_frame = cv2.resize(frame, resize_dim, interpolation=cv2.INTER_AREA)
+        if grayscale_only:
+            resized_frame = cv2.cvtColor(resized_frame, cv2.COLOR_BGR2GRAY)
+        yield resized_frame
+
+
+def _open_video(video_path, target_fps):
+    """
+    Open a video file and work out which frames to keep.
+
+    Args:
+        video_path: Path to the video file
+        target_fps: Target frames per second to extract
+
+    Returns:
+        Tuple (capture, frame_interval) of the opened cv2.VideoCapture and the
+        number of source frames per kept frame
     """
     # Open the video file
     cap = cv2.VideoCapture(video_path)
@@ -24,48 +100,44 @@ def process_video(video_path, target_fps=5, resize_dim=(1280, 720)):
     if not cap.isOpened():
         raise ValueError(f"Could not open video file: {video_path}")
 
-    # Get video properties
-    original_fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
     # Calculate frame interval for the target FPS
+    original_fps = cap.get(cv2.CAP_PROP_FPS)
     frame_interval = max(1, int(original_fps / target_fps))
 
-    # TODO: Implement frame extraction
-    # 1. Read frames from the video capture object
-    # 2. Only keep frames at the specified interval to achieve target_fps
-    # 3. Resize frames to the specified dimensions
-    # 4. Store frames in a list
-    # 5. Release the video capture object when done
-    
-
-    # Example starter code:
-    frames = []
-    frame_index = 0
-
-    # Your implementation here
-        # Loop through the video frame by frame
-    while cap.isOpened():
-        # Read a single frame from the video
-        ret, frame = cap.read()
+    return cap, frame_interval
 
-        # Break the loop if no frame is returned (end of video)
-        if not ret:
-            break
 
-        # Process and store the frame only at specified intervals to match target FPS
-        if frame_index % frame_interval == 0:
-            # Resize the frame to the desired dimensions (e.g., 1280x720)
-            resized_frame = cv2.resize(frame, resize_dim)
-            # Append the resized frame to the list
-            frames.append(resized_frame)
-
-        # Move to the next frame
-        frame_index += 1
+def _iter_decoded(cap, frame_interval):
+    """
+    Decode every frame_interval-th frame of an opened video.
 
-    # Release the video capture object to free resources
-    cap.release()
+    The capture object is released once the video ends or the generator is
+    closed.
 
-    # Return the list of extracted and resized frames
+    Args:
+        cap: Opened cv2.VideoCapture
+        frame_interval: Keep one frame out of this many
 
-    return frames
+    Yields:
+        Decoded frames at their original resolution
+    """
+    frame_index = 0
+    try:
+        # Loop through the video frame by frame
+        while True:
+            # Advance to the next frame without decoding it (end of video if it fails)
+            if not cap.grab():
+                break
+
+            # Decode the frame only at specified intervals to match target FPS
+            if frame_index % frame_interval == 0:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                yield frame
+
+            # Move to the next frame
+            frame_index += 1
+    finally:
+        # Release the video capture object to free resources
+        cap.release()
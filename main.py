@@ -7,13 +7,25 @@ This is the main entry point for the motion detection and viewport tracking prog
 
 import os
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
 import cv2
 import numpy as np
 
-from frame_processor import process_video
-from motion_detector import detect_motion
-from viewport_tracker_kalman import track_viewport
-from visualizer import visualize_results
+from frame_processor import iter_frames
+from motion_detector import USE_OPENCL, detect_motion, preprocess_frame
+from viewport_tracker_kalman import update_viewport
+from visualizer import Visualizer
+
+
+def positive_int(value):
+    """Parse a command line argument as an integer of at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
 
 
 def parse_args():
@@ -32,9 +44,70 @@ def parse_args():
         default="720x480",
         help="Size of viewport in format WIDTHxHEIGHT",
     )
+    parser.add_argument(
+        "--save_frames",
+        action="store_true",
+        help="Also save annotated frames and viewport crops as images",
+    )
+    parser.add_argument(
+        "--save_every_n",
+        type=positive_int,
+        default=1,
+        help="When saving frames, only save every n-th frame",
+    )
     return parser.parse_args()
 
 
+def iter_motion(frames, executor, max_in_flight):
+    """
+    Detect motion for a stream of frames on a thread pool, preserving order.
+
+    Frame pairs are independent, so up to max_in_flight of them are compared
+    concurrently while later frames are still being decoded; results are
+    yielded in frame order for the sequential tracking and visualization.
+
+    Args:
+        frames: Iterable of video frames
+        executor: Thread pool to run detect_motion on, or None to detect
+                  motion on the calling thread
+        max_in_flight: Maximum number of frames with detection in progress
+
+    Yields:
+        Tuples (frame, motion_boxes) in frame order
+    """
+    pending = deque()
+    prev_blurred = None
+
+    for frame in frames:
+        # Preprocess each frame once; it is compared with both neighbours
+        curr_blurred = preprocess_frame(frame)
+        if executor is None:
+            # Detect inline, e.g. for OpenCL images bound to this thread
+            if prev_blurred is None:
+                motion_boxes = []  # First frame: no motion
+            else:
+                motion_boxes = detect_motion(prev_blurred, curr_blurred)
+            prev_blurred = curr_blurred
+            yield frame, motion_boxes
+            continue
+
+        if prev_blurred is None:
+            motion_future = executor.submit(list)  # First frame: no motion
+        else:
+            motion_future = executor.submit(detect_motion, prev_blurred, curr_blurred)
+        pending.append((frame, motion_future))
+        prev_blurred = curr_blurred
+
+        # Hand back the oldest frame once enough work is queued
+        if len(pending) >= max_in_flight:
+            frame, motion_future = pending.popleft()
+            yield frame, motion_future.result()
+
+    while pending:
+        frame, motion_future = pending.popleft()
+        yield frame, motion_future.result()
+
+
 def main():
     """Main function to run the motion detection and viewport tracking pipeline."""
     # Parse arguments
@@ -53,29 +126,51 @@ def main():
     # Create output directory if it doesn't exist
     os.makedirs(args.output, exist_ok=True)
 
-    print(f"Processing video: {args.video}")
-
-    # Step 1: Extract frames from video
-    frames = process_video(args.video, args.fps)
-    print(f"Extracted {len(frames)} frames")
-
-    # Step 2: Detect motion in frames
-    motion_results = []
-    for i, frame in enumerate(frames):
-        print(f"Processing frame {i + 1}/{len(frames)}")
+    # Frame size (width, height) that every frame is resized to
+    resize_dim = (1280, 720)
 
-        # Pass the entire frames list and the current index to detect_motion
-        motion_boxes = detect_motion(frames, i)
-        motion_results.append(motion_boxes)
-
-    # Step 3: Track viewport based on motion detection
-    viewport_positions = track_viewport(frames, motion_results, viewport_size)
-
-    # Step 4: Visualize and save results
-    visualize_results(
-        frames, motion_results, viewport_positions, viewport_size, args.output
-    )
+    print(f"Processing video: {args.video}")
 
+    # Stream frames through the pipeline, keeping only a bounded window of
+    # frames in flight and the tracker state between frames
+    tracker_state = None
+    num_frames = 0
+
+    # The thread count is process-wide, so set it once here: OpenCV keeps one
+    # internal thread per core for decoding and resizing on this thread. Calls
+    # made while another parallel region is running execute serially, so the
+    # detection workers below do not multiply the number of busy threads.
+    cv2.setNumThreads(cv2.getNumberOfCPUs())
+
+    # Motion detection runs on worker threads (OpenCV releases the GIL). OpenCL
+    # images (cv2.UMat) are tied to the thread's OpenCL queue, so on that path
+    # detection stays on this thread and the GPU provides the parallelism.
+    num_workers = os.cpu_count() or 1
+    executor = None if USE_OPENCL else ThreadPoolExecutor(max_workers=num_workers)
+
+    with executor or nullcontext(), Visualizer(
+        args.output, viewport_size,
+        save_frames=args.save_frames, save_every_n=args.save_every_n,
+    ) as visualizer:
+        # Open the output videos before any detection work is submitted, since
+        # the encoder probe briefly silences the whole process's stderr
+        visualizer.open((resize_dim[1], resize_dim[0], 3))
+
+        # Steps 1-2: Extract frames from video and detect motion between them
+        frames = iter_frames(args.video, args.fps, resize_dim)
+        for frame, motion_boxes in iter_motion(frames, executor, 2 * num_workers):
+            num_frames += 1
+            print(f"Processing frame {num_frames}")
+
+            # Step 3: Track viewport based on motion detection
+            viewport_position, tracker_state = update_viewport(
+                tracker_state, motion_boxes, frame.shape, viewport_size
+            )
+
+            # Step 4: Visualize and save results
+            visualizer.write(frame, motion_boxes, viewport_position)
+
+    print(f"Processed {num_frames} frames")
     print(f"Processing complete. Results saved to {args.output}")
 
 
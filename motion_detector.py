@@ -5,46 +5,161 @@ Motion detection functions for the sports video analysis project.
 import cv2
 import numpy as np
 
-def detect_motion(frames, frame_idx, threshold=25, min_area=100):
+# Box blur used as a noise gate before differencing. The result is binarized
+# right after, so a small box filter suppresses noise as well as a Gaussian
+# while being considerably cheaper on uint8 images.
+BLUR_KERNEL_SIZE = (3, 3)
+
+# Run preprocess_frame's and detect_motion's image operations through OpenCV's
+# transparent API (cv2.UMat) when an OpenCL device is available, so they
+# execute on the GPU
+USE_OPENCL = cv2.ocl.haveOpenCL() and cv2.ocl.useOpenCL()
+
+# Dilating twice with the default 3x3 element equals a single dilation with a
+# 5x5 rectangle, which needs only one pass over the mask
+DILATE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+
+# No-motion gate: one changed pixel grows into at most this many pixels when
+# dilated, and a region's contour area never exceeds its pixel count. So if
+# the changed pixels times this factor are fewer than min_area, no region can
+# reach min_area and the dilation and contour search are skipped without
+# losing any detection.
+DILATE_KERNEL_AREA = int(np.count_nonzero(DILATE_KERNEL))
+
+
+def preprocess_frame(frame):
+    """
+    Prepare a frame for motion detection.
+
+    Call this once per frame and keep the result for comparison with the next
+    frame, so that every frame is only converted and blurred once.
+
+    Args:
+        frame: Video frame (BGR, or already grayscale)
+
+    Returns:
+        Blurred grayscale frame (a cv2.UMat when USE_OPENCL is set)
+    """
+    is_gray = frame.ndim == 2
+
+    # Upload the frame to the OpenCL device if available
+    if USE_OPENCL:
+        frame = cv2.UMat(frame)
+
+    # Convert to grayscale (unless it already is) and apply a box blur to
+    # reduce noise
+    if is_gray:
+        return cv2.boxFilter(frame, -1, BLUR_KERNEL_SIZE)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.boxFilter(gray, -1, BLUR_KERNEL_SIZE, dst=gray)
+
+
+def detect_motion(prev_blurred, curr_blurred, threshold=25, min_area=100):
     """
     Detect motion in the current frame by comparing with previous frame.
 
     Args:
-        frames: List of video frames
-        frame_idx: Index of the current frame
+        prev_blurred: Previous frame as returned by preprocess_frame
+        curr_blurred: Current frame as returned by preprocess_frame
         threshold: Threshold for frame difference detection
         min_area: Minimum contour area to consider
 
     Returns:
         List of bounding boxes for detected motion regions
     """
-    # We need at least 2 frames to detect motion
-    if frame_idx < 1 or frame_idx >= len(frames):
+    # Calculate the absolute difference between the blurred grayscale frames
+    diff = cv2.absdiff(prev_blurred, curr_blurred)
+
+    # Apply a binary threshold to the difference image
+    # Pixels with a difference above 'threshold' become white (255), others black (0)
+    _, thresh = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)
+
+    # Skip the dilation and contour search if too few pixels changed
+    if cv2.countNonZero(thresh) * DILATE_KERNEL_AREA < min_area:
         return []
 
-    # Get the current and previous frames
-    current_frame = frames[frame_idx]
-    prev_frame = frames[frame_idx - 1]
+    # Return all bounding boxes representing detected motion
+    return _find_motion_boxes(thresh, min_area)
 
-    # Convert both frames to grayscale to simplify processing
-    gray_curr = cv2.cvtColor(current_frame, cv2.COLOR_BGR2GRAY)
-    gray_prev = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
 
-    # Apply Gaussian blur to reduce noise and smooth minor differences
-    gray_curr = cv2.GaussianBlur(gray_curr, (5, 5), 0)
-    gray_prev = cv2.GaussianBlur(gray_prev, (5, 5), 0)
+def detect_motion_batch(frames, threshold=25, min_area=100):
+    """
+    Detect motion in every frame of a sequence in a single pass.
 
-    # Calculate the absolute difference between the blurred grayscale frames
-    diff = cv2.absdiff(gray_prev, gray_curr)
+    Each frame is converted to grayscale and blurred exactly once, and all
+    consecutive frame differences are computed and thresholded together.
 
-    # Apply a binary threshold to the difference image
-    # Pixels with a difference above 'threshold' become white (255), others black (0)
-    _, thresh = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)
+    Args:
+        frames: Array (or list) of video frames (BGR, or already grayscale)
+        threshold: Threshold for frame difference detection
+        min_area: Minimum contour area to consider
+
+    Returns:
+        List with one list of bounding boxes per frame (the first frame has
+        no previous frame, so its list is always empty)
+    """
+    num_frames = len(frames)
+    if num_frames < 2:
+        return [[] for _ in range(num_frames)]
+
+    height, width = frames[0].shape[:2]
+    is_gray = frames[0].ndim == 2
+
+    # Convert (unless already grayscale) and blur every frame once into
+    # preallocated buffers
+    gray = None if is_gray else np.empty((num_frames, height, width), dtype=np.uint8)
+    blurred = np.empty((num_frames, height, width), dtype=np.uint8)
+    for i in range(num_frames):
+        if is_gray:
+            frame_gray = frames[i]
+        else:
+            frame_gray = cv2.cvtColor(frames[i], cv2.COLOR_BGR2GRAY, dst=gray[i])
+        cv2.boxFilter(frame_gray, -1, BLUR_KERNEL_SIZE, dst=blurred[i])
+
+    # Difference and threshold all consecutive pairs at once; the stacks are
+    # flattened to 2D because OpenCV reads a 3D array as a multi-channel image
+    diffs = cv2.absdiff(blurred[:-1].reshape(-1, width), blurred[1:].reshape(-1, width))
+    _, thresh = cv2.threshold(diffs, threshold, 255, cv2.THRESH_BINARY)
+    thresh = thresh.reshape(num_frames - 1, height, width)
+
+    # Find the pairs with too few changed pixels to hold any motion region
+    changed_counts = np.count_nonzero(thresh.reshape(num_frames - 1, -1), axis=1)
+    static = changed_counts * DILATE_KERNEL_AREA < min_area
 
-    # Dilate the thresholded image to fill in small holes and join fragmented regions
-    dilated = cv2.dilate(thresh, None, iterations=2)
+    # Contours are inherently per image, so finish each moving frame separately
+    motion_results = [[]]
+    for i in range(num_frames - 1):
+        if static[i]:
+            motion_results.append([])
+        else:
+            motion_results.append(_find_motion_boxes(thresh[i], min_area))
 
-    # Find external contours (connected white regions) in the binary image
+    return motion_results
+
+
+def _find_motion_boxes(thresh, min_area):
+    """
+    Extract bounding boxes of significant motion regions from a binary mask.
+
+    Args:
+        thresh: Thresholded frame difference image (ndarray or cv2.UMat),
+                overwritten by its dilation
+        min_area: Minimum contour area to consider
+
+    Returns:
+        List of bounding boxes (x, y, w, h)
+    """
+    # Dilate the thresholded image in place to fill in small holes and join
+    # fragmented regions
+    dilated = cv2.dilate(thresh, DILATE_KERNEL, dst=thresh)
+
+    # Contour extraction runs on the CPU, so download GPU images once here
+    if isinstance(dilated, cv2.UMat):
+        dilated = dilated.get()
+
+    # Find external contours (connected white regions) in the binary image.
+    # On sparse motion masks this is several times faster than labeling with
+    # cv2.connectedComponentsWithStats, and the per-contour loop below is cheap.
     contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
     motion_boxes = []
@@ -57,5 +172,4 @@ def detect_motion(frames, frame_idx, threshold=25, min_area=100):
             # Add it to the list of detected motion boxes
             motion_boxes.append((x, y, w, h))
 
-    # Return all bounding boxes representing detected motion
     return motion_boxes
@@ -4,74 +4,128 @@ Viewport tracking functions for creating a smooth "virtual camera".
 
 import cv2
 import numpy as np
-from filterpy.kalman import KalmanFilter
+from scipy.linalg import solve_discrete_are
 
-def calculate_region_of_interest(motion_boxes, frame_shape):
+from _roi import calculate_region_of_interest
+
+# Constant velocity model settings. The x and y axes move independently and
+# share these values, so the 4-state filter [x, y, dx, dy] splits into two
+# identical 2-state (position, velocity) filters.
+MEASUREMENT_NOISE = 5.  # How noisy we expect measurements to be
+PROCESS_NOISE = 0.03  # Model uncertainty
+
+
+def steady_state_kalman_gain():
+    """
+    Compute the steady-state Kalman gain of the per-axis constant velocity model.
+
+    The model is time-invariant, so the state covariance converges to the
+    solution of the discrete algebraic Riccati equation within a few frames,
+    and the gain becomes constant from then on.
+
+    Returns:
+        Tuple (gain_pos, gain_vel) applied to the position residual to correct
+        the position and velocity estimates
+    """
+    F = np.array([[1., 1.],
+                  [0., 1.]])  # Position advances by velocity each frame
+    H = np.array([[1., 0.]])  # Only the position is observed
+    Q = np.eye(2) * PROCESS_NOISE
+    R = np.array([[MEASUREMENT_NOISE]])
+
+    # Predicted (prior) covariance at steady state, and the matching gain
+    P = solve_discrete_are(F.T, H.T, Q, R)
+    K = P @ H.T / (H @ P @ H.T + R)
+
+    return float(K[0, 0]), float(K[1, 0])
+
+
+# Precomputed once; each frame then only needs a handful of multiply-adds
+GAIN_POS, GAIN_VEL = steady_state_kalman_gain()
+
+
+def initialize_kalman_filter(cx, cy):
     """
-    Calculate the primary region of interest based on motion boxes.
+    Initialize a Kalman filter with a constant velocity model for 2D tracking.
 
     Args:
-        motion_boxes: List of motion detection bounding boxes
-        frame_shape: Shape of the video frame (height, width)
+        cx: Initial x position
+        cy: Initial y position
 
     Returns:
-        Tuple (x, y, w, h) representing the region of interest center point and dimensions
+        Filter state as a tuple (x, y, dx, dy)
+    """
+    return (float(cx), float(cy), 0., 0.)
+
+
+def kalman_step(state, cx, cy):
     """
-    # If no motion is detected, use the center of the frame as the default ROI
-    if not motion_boxes:
-        height, width = frame_shape[:2]
-        return (width // 2, height // 2, 0, 0)
+    Run one predict/update cycle of the constant velocity Kalman filter.
 
-    # Weighted average initialization
-    total_area = 0
-    weighted_x_sum = 0
-    weighted_y_sum = 0
+    Uses the precomputed steady-state gain, so no covariance is tracked.
 
-    # Iterate through all motion boxes and weight the centers by area
-    for (x, y, w, h) in motion_boxes:
-        area = w * h
-        center_x = x + w // 2
-        center_y = y + h // 2
+    Args:
+        state: Filter state as returned by initialize_kalman_filter
+        cx: Observed x position
+        cy: Observed y position
+
+    Returns:
+        Updated filter state
+    """
+    x, y, dx, dy = state
+
+    # Predict the next state (based on previous state and velocity)
+    x += dx
+    y += dy
 
-        weighted_x_sum += center_x * area
-        weighted_y_sum += center_y * area
-        total_area += area
+    # Correct it with the observed position
+    residual_x = cx - x
+    residual_y = cy - y
+    x += GAIN_POS * residual_x
+    y += GAIN_POS * residual_y
+    dx += GAIN_VEL * residual_x
+    dy += GAIN_VEL * residual_y
 
-    # Compute the weighted average center of all motion regions
-    avg_x = int(weighted_x_sum / total_area)
-    avg_y = int(weighted_y_sum / total_area)
+    return (x, y, dx, dy)
 
-    return (avg_x, avg_y, 0, 0)
 
-def initialize_kalman_filter():
+def update_viewport(state, motion_boxes, frame_shape, viewport_size):
     """
-    Initialize a Kalman Filter with a constant velocity model for 2D tracking.
+    Advance the Kalman-filtered viewport by one frame.
+
+    Args:
+        state: Filter state from the previous call, or None for the first frame
+        motion_boxes: Motion detection bounding boxes for this frame
+        frame_shape: Shape of the video frame (height, width)
+        viewport_size: Tuple (width, height) defining the size of the virtual camera window
 
     Returns:
-        A configured KalmanFilter object.
+        Tuple (position, state) of the viewport center (x, y) for this frame and
+        the filter state to pass in with the next frame.
     """
-    kf = KalmanFilter(dim_x=4, dim_z=2)  # State: [x, y, dx, dy]; Measurement: [x, y]
+    frame_height, frame_width = frame_shape[:2]
+    half_w, half_h = viewport_size[0] // 2, viewport_size[1] // 2
+
+    # Compute the center of motion activity (region of interest)
+    cx, cy, _, _ = calculate_region_of_interest(motion_boxes, frame_shape)
 
-    # Define how the state evolves from frame to frame (assuming constant velocity)
-    kf.F = np.array([[1, 0, 1, 0],
-                     [0, 1, 0, 1],
-                     [0, 0, 1, 0],
-                     [0, 0, 0, 1]])
+    # Initialize Kalman filter state on the first frame
+    if state is None:
+        state = initialize_kalman_filter(cx, cy)
 
-    # Define how the measurements relate to the state (we only observe x and y)
-    kf.H = np.array([[1, 0, 0, 0],
-                     [0, 1, 0, 0]])
+    # Predict the next state and update it with the observed motion center
+    state = kalman_step(state, cx, cy)
 
-    # Initial state covariance matrix (uncertainty)
-    kf.P *= 1000.
+    # Extract the filtered/smoothed viewport center
+    smoothed_x = int(state[0])
+    smoothed_y = int(state[1])
 
-    # Measurement noise covariance matrix (how noisy we expect measurements to be)
-    kf.R *= 5.
+    # Ensure the viewport stays within the video frame boundaries
+    smoothed_x = max(half_w, min(frame_width - half_w, smoothed_x))
+    smoothed_y = max(half_h, min(frame_height - half_h, smoothed_y))
 
-    # Process noise covariance matrix (model uncertainty)
-    kf.Q = np.eye(4) * 0.03
+    return (smoothed_x, smoothed_y), state
 
-    return kf
 
 def track_viewport(frames, motion_results, viewport_size):
     """
@@ -88,39 +142,17 @@ def track_viewport(frames, motion_results, viewport_size):
     viewport_positions = []
 
     # If no frames are available, return an empty list
-    if not frames:
+    if len(frames) == 0:
         return []
 
-    # Get frame and viewport dimensions
-    frame_height, frame_width = frames[0].shape[:2]
-    half_w, half_h = viewport_size[0] // 2, viewport_size[1] // 2
-
-    # Initialize Kalman filter
-    kf = initialize_kalman_filter()
+    # All frames share the same shape
+    frame_shape = frames[0].shape[:2]
 
+    state = None
     for i in range(len(frames)):
-        # Compute the center of motion activity (region of interest)
-        cx, cy, _, _ = calculate_region_of_interest(motion_results[i], frames[i].shape)
-
-        # Initialize Kalman filter state on the first frame
-        if i == 0:
-            kf.x = np.array([[cx], [cy], [0], [0]])  # [pos_x, pos_y, vel_x, vel_y]
-
-        # Predict the next state (based on previous state and velocity)
-        kf.predict()
-
-        # Update the filter with the new observed center from motion detection
-        kf.update(np.array([[cx], [cy]]))
-
-        # Extract the filtered/smoothed viewport center
-        smoothed_x = int(kf.x[0])
-        smoothed_y = int(kf.x[1])
-
-        # Ensure the viewport stays within the video frame boundaries
-        smoothed_x = max(half_w, min(frame_width - half_w, smoothed_x))
-        smoothed_y = max(half_h, min(frame_height - half_h, smoothed_y))
+        position, state = update_viewport(state, motion_results[i], frame_shape, viewport_size)
 
         # Save the final viewport center for this frame
-        viewport_positions.append((smoothed_x, smoothed_y))
+        viewport_positions.append(position)
 
     return viewport_positions
@@ -3,79 +3,292 @@ Visualization functions for displaying motion detection and viewport tracking re
 """
 
 import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 import cv2
 import numpy as np
 
-def visualize_results(
-    frames, motion_results, viewport_positions, viewport_size, output_dir
-):
+# JPEG quality for saved frame images (lower values encode faster)
+JPEG_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 85]
+
+# Overlay styles (BGR colors)
+MOTION_BOX_COLOR = (0, 255, 0)
+VIEWPORT_COLOR = (255, 0, 0)
+LABEL_COLOR = (0, 255, 255)
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_ORIGIN = (10, 30)
+
+
+class Visualizer:
     """
-    Create visualization of motion detection and viewport tracking results.
+    Incrementally write motion detection and viewport tracking visualizations.
 
-    Args:
-        frames: List of video frames
-        motion_results: List of motion detection results for each frame
-        viewport_positions: List of viewport center positions for each frame
-        viewport_size: Tuple (width, height) of the viewport
-        output_dir: Directory to save visualization results
+    Frames are annotated and written to the output videos one at a time as
+    they are passed to write(), so no frames need to be kept in memory. The
+    video writers are opened by open() if the frame size is known up front,
+    otherwise on the first frame.
     """
-    # Create directories to save annotated full frames and cropped viewports
-    frames_dir = os.path.join(output_dir, "frames")
-    os.makedirs(frames_dir, exist_ok=True)
 
-    viewport_dir = os.path.join(output_dir, "viewport")
-    os.makedirs(viewport_dir, exist_ok=True)
+    def __init__(self, output_dir, viewport_size, save_frames=False, save_every_n=1):
+        """
+        Args:
+            output_dir: Directory to save visualization results
+            viewport_size: Tuple (width, height) of the viewport
+            save_frames: Also save annotated frames and viewport crops as JPEG
+                         images (the output videos are always written)
+            save_every_n: When saving images, only save every n-th frame (>= 1)
+        """
+        if save_every_n < 1:
+            raise ValueError(f"save_every_n must be at least 1, got {save_every_n}")
+
+        self.viewport_size = viewport_size
+        self.save_frames = save_frames
+        self.save_every_n = save_every_n
+        self.frame_count = 0
+
+        # Output paths for the videos and the optional image directories
+        self.video_path = os.path.join(output_dir, "motion_detection.mp4")
+        self.viewport_video_path = os.path.join(output_dir, "viewport_tracking.mp4")
+        self.frames_dir = os.path.join(output_dir, "frames")
+        self.viewport_dir = os.path.join(output_dir, "viewport")
+
+        # Create the output directory, plus directories to save annotated full
+        # frames and cropped viewports if requested
+        os.makedirs(output_dir, exist_ok=True)
+        if save_frames:
+            os.makedirs(self.frames_dir, exist_ok=True)
+            os.makedirs(self.viewport_dir, exist_ok=True)
 
-    # Get original frame dimensions
-    height, width = frames[0].shape[:2]
+        # Encode image files on a thread pool while the caller's thread feeds the
+        # (not thread-safe) video writers; OpenCV releases the GIL while encoding
+        num_workers = os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=num_workers) if save_frames else None
+        self.pending = deque()
+        self.max_pending = 4 * num_workers
 
-    # Create video writer for full annotated frame video
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    video_path = os.path.join(output_dir, "motion_detection.mp4")
-    video_writer = cv2.VideoWriter(video_path, fourcc, 5, (width, height))
+        # Created on the first frame
+        self.video_writer = None
+        self.viewport_writer = None
+        self.vis_frame = None
+        self.crop = None
 
-    # Create video writer for cropped viewport-only video
-    viewport_video_path = os.path.join(output_dir, "viewport_tracking.mp4")
-    vp_width, vp_height = viewport_size
-    viewport_writer = cv2.VideoWriter(
-        viewport_video_path, fourcc, 5, (vp_width, vp_height)
-    )
+    def __enter__(self):
+        return self
 
-    # Loop over each frame to annotate and extract viewport
-    for i, frame in enumerate(frames):
-        vis_frame = frame.copy()  # Work on a copy to preserve the original
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self, frame_shape):
+        """
+        Create the video writers and scratch buffers for the given frame shape.
+
+        Opening the writers probes for a hardware encoder with stderr
+        silenced, so callers running other threads should call this before
+        starting them.
+
+        Args:
+            frame_shape: Shape of the video frames, (height, width, 3) for color
+                         or (height, width) for grayscale frames
+        """
+        height, width = frame_shape[:2]
+        is_color = len(frame_shape) == 3
+
+        # The cropped viewport is clipped to the frame, so a viewport larger
+        # than the frame yields a crop of the frame's size in that dimension
+        half_w, half_h = self.viewport_size[0] // 2, self.viewport_size[1] // 2
+        crop_width, crop_height = min(2 * half_w, width), min(2 * half_h, height)
+
+        # Create video writers for the full annotated frame video and the
+        # cropped viewport-only video (both or neither, so close() only ever
+        # reports videos whose writers opened)
+        video_writer = _open_video_writer(self.video_path, 5, (width, height), is_color)
+        try:
+            viewport_writer = _open_video_writer(
+                self.viewport_video_path, 5, (crop_width, crop_height), is_color
+            )
+        except ValueError:
+            video_writer.release()
+            raise
+        self.video_writer, self.viewport_writer = video_writer, viewport_writer
+
+        # Preallocate scratch buffers reused for every frame: the annotated frame
+        # and a contiguous copy of the viewport crop for the video writer
+        self.vis_frame = np.empty(frame_shape, dtype=np.uint8)
+        self.crop = np.empty((crop_height, crop_width, *frame_shape[2:]), dtype=np.uint8)
+
+    def write(self, frame, motion_boxes, viewport_position):
+        """
+        Annotate one frame and append it to the outputs.
+
+        Args:
+            frame: Video frame
+            motion_boxes: Motion detection bounding boxes for this frame
+            viewport_position: Viewport center (x, y) for this frame
+        """
+        if self.video_writer is None:
+            self.open(frame.shape)
+
+        i = self.frame_count
+        vis_frame, crop = self.vis_frame, self.crop
+        half_w, half_h = self.viewport_size[0] // 2, self.viewport_size[1] // 2
+
+        np.copyto(vis_frame, frame)  # Work on a copy to preserve the original
 
         # Draw green motion detection bounding boxes
-        for (x, y, w, h) in motion_results[i]:
-            cv2.rectangle(vis_frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        for (x, y, w, h) in motion_boxes:
+            cv2.rectangle(vis_frame, (x, y), (x + w, y + h), MOTION_BOX_COLOR, 2)
 
         # Draw blue viewport rectangle centered at predicted location
-        cx, cy = viewport_positions[i]
-        half_w, half_h = vp_width // 2, vp_height // 2
+        cx, cy = viewport_position
         top_left = (cx - half_w, cy - half_h)
         bottom_right = (cx + half_w, cy + half_h)
-        cv2.rectangle(vis_frame, top_left, bottom_right, (255, 0, 0), 2)
+        cv2.rectangle(vis_frame, top_left, bottom_right, VIEWPORT_COLOR, 2)
 
-        # Extract the viewport area from the frame
-        crop = frame[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]]
+        # Extract the viewport area from the frame, shifting the crop window
+        # inside the frame if the viewport reaches past its edges
+        crop_height, crop_width = crop.shape[:2]
+        frame_height, frame_width = frame.shape[:2]
+        x1 = min(max(top_left[0], 0), frame_width - crop_width)
+        y1 = min(max(top_left[1], 0), frame_height - crop_height)
+        np.copyto(crop, frame[y1:y1 + crop_height, x1:x1 + crop_width])
 
         # Overlay frame number as yellow text
-        cv2.putText(vis_frame, f"Frame {i+1}", (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+        cv2.putText(vis_frame, f"Frame {i+1}", LABEL_ORIGIN,
+                    LABEL_FONT, 1, LABEL_COLOR, 2)
+
+        if self.save_frames and i % self.save_every_n == 0:
+            # Wait for the oldest writes if encoding falls behind, to bound memory
+            while len(self.pending) >= self.max_pending:
+                self.pending.popleft().result()
 
-        # Save the annotated frame and cropped viewport as images
-        cv2.imwrite(os.path.join(frames_dir, f"frame_{i:03d}.jpg"), vis_frame)
-        cv2.imwrite(os.path.join(viewport_dir, f"viewport_{i:03d}.jpg"), crop)
+            # Save the annotated frame and cropped viewport as images in the background
+            # (copied, since the scratch buffers are overwritten by the next frame)
+            self.pending.append(self.executor.submit(
+                cv2.imwrite, os.path.join(self.frames_dir, f"frame_{i:03d}.jpg"),
+                vis_frame.copy(), JPEG_PARAMS))
+            self.pending.append(self.executor.submit(
+                cv2.imwrite, os.path.join(self.viewport_dir, f"viewport_{i:03d}.jpg"),
+                crop.copy(), JPEG_PARAMS))
 
         # Add frames to the corresponding output videos
-        video_writer.write(vis_frame)
-        viewport_writer.write(crop)
+        self.video_writer.write(vis_frame)
+        self.viewport_writer.write(crop)
+
+        self.frame_count += 1
+
+    def close(self):
+        """Finish pending image writes and release the video writers."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        while self.pending:
+            self.pending.popleft().result()
+
+        # Nothing to report if the writers were never (successfully) opened
+        if self.video_writer is None:
+            return
+        self.video_writer.release()
+        self.viewport_writer.release()
+        self.video_writer = None
+        self.viewport_writer = None
 
-    # Release the video writers
-    video_writer.release()
-    viewport_writer.release()
+        # Print output paths for confirmation
+        print(f"Visualization saved to {self.video_path}")
+        print(f"Viewport video saved to {self.viewport_video_path}")
+        if self.save_frames:
+            print(f"Individual frames saved to {self.frames_dir} and {self.viewport_dir}")
 
-    # Print output paths for confirmation
-    print(f"Visualization saved to {video_path}")
-    print(f"Viewport video saved to {viewport_video_path}")
-    print(f"Individual frames saved to {frames_dir} and {viewport_dir}")
+
+def _open_video_writer(path, fps, frame_size, is_color=True):
+    """
+    Open an MP4 video writer, preferring a hardware H.264 encoder.
+
+    Falls back to OpenCV's software MPEG-4 encoder if no hardware encoder is
+    available (or the OpenCV build does not support acceleration hints).
+
+    Args:
+        path: Output video file path
+        fps: Frame rate of the output video
+        frame_size: Tuple (width, height) of the video frames
+        is_color: Whether frames are 3-channel BGR (otherwise grayscale)
+
+    Returns:
+        An opened cv2.VideoWriter
+    """
+    # Probe quietly: a missing hardware encoder is expected, and OpenCV and
+    # FFmpeg would otherwise print several error lines for it
+    with _quiet_stderr():
+        try:
+            writer = cv2.VideoWriter(
+                path, cv2.VideoWriter_fourcc(*"avc1"), fps, frame_size,
+                [cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY,
+                 cv2.VIDEOWRITER_PROP_IS_COLOR, int(is_color)],
+            )
+        except (AttributeError, cv2.error):
+            writer = None
+
+    if writer is not None:
+        # VIDEO_ACCELERATION_ANY may also settle for a software H.264 encoder,
+        # which is slower than MPEG-4, so keep the writer only if it is accelerated
+        if (writer.isOpened() and writer.get(cv2.VIDEOWRITER_PROP_HW_ACCELERATION)
+                != cv2.VIDEO_ACCELERATION_NONE):
+            return writer
+        writer.release()
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, frame_size, is_color)
+    if not writer.isOpened():
+        raise ValueError(f"Could not open video writer: {path}")
+    return writer
+
+
+@contextmanager
+def _quiet_stderr():
+    """
+    Discard everything written to the process's stderr within the block.
+
+    FFmpeg logs straight to file descriptor 2, so this redirects the
+    descriptor rather than sys.stderr. Output from other threads during the
+    block is discarded too, so only use it while no other threads are working.
+    """
+    sys.stderr.flush()
+    try:
+        saved_fd = os.dup(2)
+    except OSError:
+        # No stderr to silence (e.g. a windowed process)
+        yield
+        return
+
+    devnull_fd = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(devnull_fd, 2)
+        yield
+    finally:
+        os.dup2(saved_fd, 2)
+        os.close(saved_fd)
+        os.close(devnull_fd)
+
+
+def visualize_results(
+    frames, motion_results, viewport_positions, viewport_size, output_dir,
+    save_frames=False, save_every_n=1,
+):
+    """
+    Create visualization of motion detection and viewport tracking results.
+
+    Args:
+        frames: Array (or list) of video frames
+        motion_results: List of motion detection results for each frame
+        viewport_positions: List of viewport center positions for each frame
+        viewport_size: Tuple (width, height) of the viewport
+        output_dir: Directory to save visualization results
+        save_frames: Also save annotated frames and viewport crops as JPEG images
+                     (the output videos are always written)
+        save_every_n: When saving images, only save every n-th frame
+    """
+    with Visualizer(output_dir, viewport_size, save_frames, save_every_n) as visualizer:
+        # Loop over each frame to annotate and extract viewport
+        for i, frame in enumerate(frames):
+            visualizer.write(frame, motion_results[i], viewport_positions[i])